@@ -23,128 +23,49 @@ import sys
 import subprocess
 import re
 import argparse
-from pathlib import Path
+import functools
+import operator
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-class CookbookGenerator:
-    def __init__(self, title="My Cookbook", author=None, include_index=True, include_toc=True):
-        self.title = title
-        self.author = author
-        self.include_index = include_index
-        self.include_toc = include_toc
-        self.chapters = {}
-
-    def get_recipe_latex(self, recipe_path):
-        """Extract LaTeX content from a recipe using CookCLI."""
-        try:
-            # Try using installed 'cook' command
-            result = subprocess.run(
-                ["cook", "recipe", "-f", "latex", str(recipe_path)],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-
-            # If 'cook' not found, try cargo run as fallback
-            if result.returncode != 0 and "not found" in result.stderr:
-                result = subprocess.run(
-                    ["cargo", "run", "--", "recipe", "-f", "latex", str(recipe_path)],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-
-            if result.returncode != 0:
-                return None, {}
-
-            content = result.stdout
-
-            # Extract metadata from comments
-            metadata = self.extract_metadata(content)
-
-            # Look for marker comments
-            start_marker = r'% BEGIN_RECIPE_CONTENT'
-            end_marker = r'% END_RECIPE_CONTENT'
-
-            start_match = re.search(start_marker, content)
-            end_match = re.search(end_marker, content)
-
-            if start_match and end_match:
-                # Use marker comments if present
-                # Include everything after the newline following BEGIN marker
-                # up to the line before END marker
-                start_pos = content.find('\n', start_match.start()) + 1
-                end_pos = content.rfind('\n', 0, end_match.start())
-                recipe_content = content[start_pos:end_pos].strip()
-
-                # Remove the title section since we're adding it as a LaTeX section
-                # Look for BEGIN_TITLE...END_TITLE block and remove it
-                title_start = re.search(r'% BEGIN_TITLE', recipe_content)
-                title_end = re.search(r'% END_TITLE', recipe_content)
-                if title_start and title_end:
-                    # Find the newline after END_TITLE to remove the whole block
-                    title_end_pos = recipe_content.find('\n', title_end.end())
-                    if title_end_pos == -1:
-                        title_end_pos = title_end.end()
-                    recipe_content = recipe_content[:title_start.start()] + recipe_content[title_end_pos:].lstrip()
-            else:
-                return None, metadata
-
-            return recipe_content, metadata
-
-        except Exception as e:
-            print(f"Error processing {recipe_path}: {e}", file=sys.stderr)
-
-        return None, {}
-
-    def extract_metadata(self, latex_content):
-        """Extract metadata from LaTeX comments."""
-        metadata = {}
-
-        patterns = {
-            'description': r'% DESCRIPTION: (.+)',
-            'tags': r'% TAGS: (.+)',
-            'servings': r'% SERVINGS: (.+)',
-            'prep_time': r'% PREP_TIME: (.+)',
-            'cook_time': r'% COOK_TIME: (.+)',
-            'author': r'% AUTHOR: (.+)',
-            'source': r'% SOURCE: (.+)',
-        }
-
-        for key, pattern in patterns.items():
-            match = re.search(pattern, latex_content)
-            if match:
-                metadata[key] = match.group(1)
-
-        return metadata
-
-    def scan_recipes(self, recipe_dir):
-        """Scan directory for .cook files and organize by chapter."""
-        recipe_path = Path(recipe_dir)
-
-        for cook_file in recipe_path.rglob("*.cook"):
-            rel_path = cook_file.relative_to(recipe_path)
-
-            # Determine chapter based on directory structure
-            if len(rel_path.parts) > 1:
-                chapter = self.format_chapter_name(rel_path.parts[0])
-            else:
-                chapter = "Main Dishes"
-
-            if chapter not in self.chapters:
-                self.chapters[chapter] = []
-
-            self.chapters[chapter].append(cook_file)
-
-    def format_chapter_name(self, name):
-        """Format directory name as chapter name."""
-        # Convert underscores/hyphens to spaces and capitalize
-        name = name.replace('_', ' ').replace('-', ' ')
-        return ' '.join(word.capitalize() for word in name.split())
-
-    def generate_header(self):
-        """Generate LaTeX document header."""
-        header = r"""\documentclass[11pt,a4paper,twoside]{book}
+# Marker comments emitted by CookCLI's LaTeX output
+_START_MARKER = b'% BEGIN_RECIPE_CONTENT'
+_END_MARKER = b'% END_RECIPE_CONTENT'
+_TITLE_START_MARKER = '% BEGIN_TITLE'
+_TITLE_END_MARKER = '% END_TITLE'
+
+# Metadata fields, in the order they are reported
+_METADATA_KEYS = ('description', 'tags', 'servings', 'prep_time', 'cook_time', 'author', 'source')
+
+# Metadata comments; the lowercased key names the metadata field.
+# Matched against raw CookCLI output, hence a bytes pattern; values stop
+# at '\r' as well, since the output is not newline-translated. The whole
+# match sits in a lookahead so a key following another key's value on
+# the same line is still found.
+_META_RE = re.compile(
+    rb'(?=% (?P<key>DESCRIPTION|TAGS|SERVINGS|PREP_TIME|COOK_TIME|AUTHOR|SOURCE): (?P<val>[^\r\n]+))'
+)
+
+# Special LaTeX characters and their escaped forms, applied in a single pass
+_LATEX_ESCAPES = str.maketrans({
+    '\\': r'\textbackslash{}',
+    '{': r'\{',
+    '}': r'\}',
+    '$': r'\$',
+    '&': r'\&',
+    '#': r'\#',
+    '^': r'\^{}',
+    '_': r'\_',
+    '~': r'\~{}',
+    '%': r'\%',
+    '<': r'\textless{}',
+    '>': r'\textgreater{}',
+    '|': r'\textbar{}',
+})
+
+# Static pieces of the LaTeX document header, assembled by generate_header
+_HEADER_PREAMBLE = r"""\documentclass[11pt,a4paper,twoside]{book}
 \usepackage{fontspec}
 \usepackage{polyglossia}
 \setdefaultlanguage{russian}
@@ -161,12 +82,11 @@ class CookbookGenerator:
 \usepackage{geometry}
 \usepackage{hyperref}"""
 
-        if self.include_index:
-            header += r"""
+_HEADER_INDEX_PACKAGES = r"""
 \usepackage{makeidx}
 \usepackage{imakeidx}"""
 
-        header += r"""
+_HEADER_SETUP = r"""
 \usepackage{fancyhdr}
 \usepackage{tocloft}
 
@@ -184,18 +104,19 @@ class CookbookGenerator:
 \newcommand{\timer}[1]{\textcolor{timercolor}{\textbf{#1}}}
 """
 
-        if self.include_index:
-            header += r"""
+_HEADER_INDEX_SETUP = r"""
 % Index setup
 \makeindex[columns=2, title=Указатель рецептов, intoc]"""
 
-        header += r"""
+_HEADER_PAGE_STYLE = r"""
 
 % Page style
 \pagestyle{fancy}
 \fancyhf{}
 \fancyhead[LE,RO]{\thepage}
-\fancyhead[RE]{\textit{""" + self.escape_latex(self.title) + r"""}}
+\fancyhead[RE]{\textit{"""
+
+_HEADER_TITLE_PAGE = r"""}}
 \fancyhead[LO]{\leftmark}
 \renewcommand{\headrulewidth}{0.4pt}
 
@@ -215,14 +136,13 @@ class CookbookGenerator:
 \begin{titlepage}
 \centering
 \vspace*{5cm}
-{\Huge\bfseries """ + self.escape_latex(self.title) + r"""}\par"""
+{\Huge\bfseries """
 
-        if self.author:
-            header += r"""
+_HEADER_AUTHOR = r"""
 \vspace{2cm}
-{\Large """ + self.escape_latex(self.author) + r"""}\par"""
+{\Large """
 
-        header += r"""
+_HEADER_TITLE_PAGE_END = r"""
 \vfill
 \textit{Created with CookCLI}\par
 \vspace{1cm}
@@ -230,14 +150,185 @@ class CookbookGenerator:
 \end{titlepage}
 """
 
-        if self.include_toc:
-            header += r"""
+_HEADER_TOC = r"""
 % Table of contents
 \tableofcontents
 \clearpage
 """
 
-        return header
+def _scandir_cook(root, dir_contents):
+    """Recursively yield (directory, file name) pairs for .cook files under root.
+
+    Every file name seen is recorded in dir_contents, keyed by its directory.
+    Unreadable directories are skipped, as Path.rglob does.
+    """
+    names = dir_contents.setdefault(root, set())
+    try:
+        it = os.scandir(root)
+    except PermissionError:
+        return
+
+    with it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scandir_cook(entry.path, dir_contents)
+            else:
+                names.add(entry.name)
+                if entry.name.endswith('.cook'):
+                    yield root, entry.name
+
+class CookbookGenerator:
+    def __init__(self, title="My Cookbook", author=None, include_index=True, include_toc=True):
+        self.title = title
+        self.author = author
+        self._title_tex = self.escape_latex(title)
+        self._author_tex = self.escape_latex(author) if author else None
+        self.include_index = include_index
+        self.include_toc = include_toc
+        self.chapters = {}
+        self._dir_contents = {}
+        # Prefer the installed 'cook' command, fall back to cargo run
+        self._cmd_prefix = ["cook"] if shutil.which("cook") else ["cargo", "run", "--"]
+
+    def get_recipe_latex(self, recipe_path):
+        """Extract LaTeX content from a recipe using CookCLI."""
+        try:
+            # 'cook recipe' takes a single recipe, so each one is still its own
+            # process (overlapped by the pool in generate)
+            result = subprocess.run(
+                self._cmd_prefix + ["recipe", "-f", "latex", os.fspath(recipe_path)],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+
+            if result.returncode != 0:
+                return None, {}
+
+            # Kept as bytes: only the extracted recipe body below gets decoded
+            content = result.stdout
+
+            # Extract metadata from comments
+            metadata = self.extract_metadata(content)
+
+            # Look for marker comments; they are literal, so plain find is enough
+            start_pos = content.find(_START_MARKER)
+            if start_pos < 0:
+                return None, metadata
+            end_pos = content.find(_END_MARKER, start_pos)
+            if end_pos < 0:
+                return None, metadata
+
+            # Include everything after the newline following BEGIN marker
+            # up to the line before END marker
+            start_pos = content.find(b'\n', start_pos) + 1
+            end_pos = content.rfind(b'\n', 0, end_pos)
+
+            # Decode only the recipe body, translating newlines as text mode
+            # did, and strip it as str so Unicode whitespace goes too
+            recipe_content = content[start_pos:end_pos].decode('utf-8')
+            if '\r' in recipe_content:
+                recipe_content = recipe_content.replace('\r\n', '\n').replace('\r', '\n')
+            recipe_content = recipe_content.strip()
+
+            # Remove the title section since we're adding it as a LaTeX section
+            # Look for BEGIN_TITLE...END_TITLE block and remove it
+            # (CookCLI has no option to leave it out, so it is cut here)
+            title_start = recipe_content.find(_TITLE_START_MARKER)
+            title_end = recipe_content.find(_TITLE_END_MARKER, title_start) if title_start >= 0 else -1
+            if title_end >= 0:
+                # Find the newline after END_TITLE to remove the whole block
+                title_end += len(_TITLE_END_MARKER)
+                title_end_pos = recipe_content.find('\n', title_end)
+                if title_end_pos == -1:
+                    title_end_pos = title_end
+                recipe_content = recipe_content[:title_start] + recipe_content[title_end_pos:].lstrip()
+
+            return recipe_content, metadata
+
+        except Exception as e:
+            print(f"Error processing {recipe_path}: {e}", file=sys.stderr)
+
+        return None, {}
+
+    def extract_metadata(self, latex_content):
+        """Extract metadata from LaTeX comments in raw (bytes) CookCLI output."""
+        # Most recipes carry no metadata comments at all
+        first = _META_RE.search(latex_content)
+        if first is None:
+            return {}
+
+        metadata = {}
+
+        # Single pass over the content, resuming at the first match;
+        # the first occurrence of a key wins
+        for match in _META_RE.finditer(latex_content, first.start()):
+            key = match['key'].decode('ascii').lower()
+            if key not in metadata:
+                metadata[key] = match['val'].decode('utf-8')
+
+        return {key: metadata[key] for key in _METADATA_KEYS if key in metadata}
+
+    def scan_recipes(self, recipe_dir):
+        """Scan directory for .cook files and organize by chapter."""
+        try:
+            with os.scandir(recipe_dir) as it:
+                top_entries = list(it)
+        except OSError:
+            # Not a readable directory: no recipes, as with Path.rglob
+            return
+
+        self._dir_contents[recipe_dir] = {
+            entry.name for entry in top_entries if not entry.is_dir(follow_symlinks=False)
+        }
+
+        for top_entry in top_entries:
+            # Determine chapter based on directory structure
+            if top_entry.is_dir(follow_symlinks=False):
+                chapter = self.format_chapter_name(top_entry.name)
+                cook_files = _scandir_cook(top_entry.path, self._dir_contents)
+            elif top_entry.name.endswith('.cook'):
+                chapter = "Main Dishes"
+                cook_files = [(recipe_dir, top_entry.name)]
+            else:
+                continue
+
+            for cook_file in cook_files:
+                if chapter not in self.chapters:
+                    self.chapters[chapter] = []
+
+                self.chapters[chapter].append(cook_file)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def format_chapter_name(name):
+        """Format directory name as chapter name (cached per directory name)."""
+        # Convert underscores/hyphens to spaces and capitalize
+        name = name.replace('_', ' ').replace('-', ' ')
+        return ' '.join(word.capitalize() for word in name.split())
+
+    def generate_header(self):
+        """Generate LaTeX document header."""
+        parts = [_HEADER_PREAMBLE]
+
+        if self.include_index:
+            parts.append(_HEADER_INDEX_PACKAGES)
+
+        parts.append(_HEADER_SETUP)
+
+        if self.include_index:
+            parts.append(_HEADER_INDEX_SETUP)
+
+        parts += [_HEADER_PAGE_STYLE, self._title_tex, _HEADER_TITLE_PAGE, self._title_tex, r"}\par"]
+
+        if self._author_tex:
+            parts += [_HEADER_AUTHOR, self._author_tex, r"}\par"]
+
+        parts.append(_HEADER_TITLE_PAGE_END)
+
+        if self.include_toc:
+            parts.append(_HEADER_TOC)
+
+        return "".join(parts)
 
     def generate_footer(self):
         """Generate LaTeX document footer."""
@@ -254,40 +345,31 @@ class CookbookGenerator:
 """
         return footer
 
-    def find_recipe_image(self, recipe_file):
-        """Find an image file with the same base name as the recipe."""
+    def find_recipe_image(self, recipe_dir, recipe_stem):
+        """Find an image file with the same base name as the recipe.
+
+        Returns the image file name within recipe_dir, or None.
+        """
         image_extensions = ['.png', '.jpg', '.jpeg', '.PNG', '.JPG', '.JPEG']
-        recipe_dir = recipe_file.parent
-        recipe_stem = recipe_file.stem
+
+        # Directory listings are collected by scan_recipes, so this is a
+        # set lookup rather than a stat per extension
+        files = self._dir_contents.get(recipe_dir)
+        if files is None:
+            files = self._dir_contents[recipe_dir] = set(os.listdir(recipe_dir))
 
         for ext in image_extensions:
-            image_path = recipe_dir / f"{recipe_stem}{ext}"
-            if image_path.exists():
-                return image_path
+            image_name = recipe_stem + ext
+            if image_name in files:
+                return image_name
 
         return None
 
-    def escape_latex(self, text):
-        """Escape special LaTeX characters."""
-        replacements = {
-            '\\': r'\\',
-            '{': r'\{',
-            '}': r'\}',
-            '$': r'\$',
-            '&': r'\&',
-            '#': r'\#',
-            '^': r'\^{}',
-            '_': r'\_',
-            '~': r'\~{}',
-            '%': r'\%',
-            '<': r'\textless{}',
-            '>': r'\textgreater{}',
-            '|': r'\textbar{}',
-        }
-
-        for old, new in replacements.items():
-            text = text.replace(old, new)
-        return text
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def escape_latex(text):
+        """Escape special LaTeX characters (cached, tags and names repeat a lot)."""
+        return text.translate(_LATEX_ESCAPES)
 
     def generate(self, recipe_dir, output_file):
         """Generate the complete cookbook."""
@@ -300,72 +382,100 @@ class CookbookGenerator:
 
         print(f"Found {sum(len(recipes) for recipes in self.chapters.values())} recipes in {len(self.chapters)} chapters")
 
-        with open(output_file, 'w') as f:
+        # Sort once up front: recipes by file name (directory breaks ties)
+        chapter_names = sorted(self.chapters)
+        for chapter_name in chapter_names:
+            self.chapters[chapter_name].sort(key=operator.itemgetter(1, 0))
+
+        # Run CookCLI for all recipes concurrently; results are consumed
+        # below in chapter/recipe order so the output stays deterministic
+        recipe_files = [
+            recipe_file
+            for chapter_name in chapter_names
+            for recipe_file in self.chapters[chapter_name]
+        ]
+
+        # Image paths are written absolute; resolve the working directory once
+        cwd = os.getcwd()
+
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor, open(output_file, 'w', buffering=1 << 20) as f:
+            results = {
+                recipe_file: executor.submit(self.get_recipe_latex, os.path.join(*recipe_file))
+                for recipe_file in recipe_files
+            }
+
             # Write header
             f.write(self.generate_header())
 
             # Process each chapter
-            for chapter_name in sorted(self.chapters.keys()):
+            for chapter_name in chapter_names:
                 print(f"\nProcessing chapter: {chapter_name}")
                 f.write(f"\n\\chapter{{{self.escape_latex(chapter_name)}}}\n\n")
 
                 # Process recipes in chapter
-                for recipe_file in sorted(self.chapters[chapter_name]):
-                    recipe_name = recipe_file.stem.replace('_', ' ').replace('-', ' ')
+                for recipe_file in self.chapters[chapter_name]:
+                    file_dir, file_name = recipe_file
+                    recipe_stem = file_name[:-len('.cook')]
+                    recipe_name = recipe_stem.replace('_', ' ').replace('-', ' ')
                     print(f"  Adding recipe: {recipe_name}")
 
                     # Get recipe content and metadata
-                    content, metadata = self.get_recipe_latex(recipe_file)
+                    content, metadata = results[recipe_file].result()
+
+                    # Collect the recipe's fragments and write them in one go
+                    parts = []
 
                     # Add recipe to index with tags if available
                     if self.include_index:
-                        f.write(f"\\index{{{self.escape_latex(recipe_name)}}}\n")
+                        parts.append(f"\\index{{{self.escape_latex(recipe_name)}}}\n")
 
                         # Index by tags
                         if 'tags' in metadata:
                             tags = metadata['tags'].split(', ')
                             for tag in tags:
-                                f.write(f"\\index{{{self.escape_latex(tag)}!{self.escape_latex(recipe_name)}}}\n")
+                                parts.append(f"\\index{{{self.escape_latex(tag)}!{self.escape_latex(recipe_name)}}}\n")
 
                         # Index by author if available
                         if 'author' in metadata:
-                            f.write(f"\\index{{Authors!{self.escape_latex(metadata['author'])}!{self.escape_latex(recipe_name)}}}\n")
+                            parts.append(f"\\index{{Authors!{self.escape_latex(metadata['author'])}!{self.escape_latex(recipe_name)}}}\n")
 
                     # Add metadata as LaTeX comments for reference
                     if metadata:
-                        f.write(f"% Recipe: {recipe_name}\n")
+                        parts.append(f"% Recipe: {recipe_name}\n")
                         for key, value in metadata.items():
-                            f.write(f"% {key}: {value}\n")
-                        f.write("\n")
+                            parts.append(f"% {key}: {value}\n")
+                        parts.append("\n")
 
                     # Add section for TOC but suppress its display with a phantom section
-                    f.write(f"\\phantomsection\n")
-                    f.write(f"\\addcontentsline{{toc}}{{section}}{{{self.escape_latex(recipe_name)}}}\n")
+                    parts.append(f"\\phantomsection\n")
+                    parts.append(f"\\addcontentsline{{toc}}{{section}}{{{self.escape_latex(recipe_name)}}}\n")
 
                     # Add a larger, centered title for visual impact
-                    f.write("\\begin{center}\n")
-                    f.write(f"{{\\Huge\\bfseries {self.escape_latex(recipe_name)}}}\n")
-                    f.write("\\end{center}\n")
-                    f.write("\\vspace{1cm}\n\n")
+                    parts.append("\\begin{center}\n")
+                    parts.append(f"{{\\Huge\\bfseries {self.escape_latex(recipe_name)}}}\n")
+                    parts.append("\\end{center}\n")
+                    parts.append("\\vspace{1cm}\n\n")
 
                     # Check for and include recipe image
-                    image_path = self.find_recipe_image(recipe_file)
-                    if image_path:
-                        print(f"    Including image: {image_path.name}")
+                    image_name = self.find_recipe_image(file_dir, recipe_stem)
+                    if image_name:
+                        print(f"    Including image: {image_name}")
                         # Use center environment - grffile package handles spaces
-                        f.write("\\begin{center}\n")
-                        image_path_str = str(image_path.absolute())
-                        f.write(f"\\includegraphics[width=0.8\\textwidth]{{{image_path_str}}}\n")
-                        f.write("\\end{center}\n")
-                        f.write("\\vspace{0.5cm}\n\n")
+                        parts.append("\\begin{center}\n")
+                        image_path_str = os.path.join(cwd, file_dir, image_name)
+                        parts.append(f"\\includegraphics[width=0.8\\textwidth]{{{image_path_str}}}\n")
+                        parts.append("\\end{center}\n")
+                        parts.append("\\vspace{0.5cm}\n\n")
 
                     # Write recipe content
                     if content:
-                        f.write(content)
-                        f.write("\n\n\\clearpage\n\n")
+                        parts.append(content)
+                        parts.append("\n\n\\clearpage\n\n")
                     else:
-                        print(f"    Warning: Could not process {recipe_file}", file=sys.stderr)
-                        f.write("\\textit{Recipe content could not be processed.}\n\n\\clearpage\n\n")
+                        print(f"    Warning: Could not process {os.path.join(file_dir, file_name)}", file=sys.stderr)
+                        parts.append("\\textit{Recipe content could not be processed.}\n\n\\clearpage\n\n")
+
+                    f.write("".join(parts))
 
             # Write footer
             f.write(self.generate_footer())